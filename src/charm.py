@@ -5,12 +5,14 @@
 
 """A Juju charm for managing the Istio service mesh control plane."""
 
+import functools
 import logging
 from pathlib import Path
-from typing import Dict, List
+from typing import Dict, Iterable, List
 from urllib.parse import urlparse
 
 import ops
+import yaml
 from charms.grafana_k8s.v0.grafana_dashboard import GrafanaDashboardProvider
 from charms.prometheus_k8s.v0.prometheus_scrape import MetricsEndpointProvider
 from charms.tempo_coordinator_k8s.v0.charm_tracing import trace_charm
@@ -19,6 +21,7 @@ from charms.tempo_coordinator_k8s.v0.tracing import TracingEndpointRequirer
 # Ignore pyright errors until https://github.com/gtsystem/lightkube/pull/70 is released
 from lightkube import Client, codecs  # type: ignore
 from lightkube.codecs import AnyResource
+from lightkube.generic_resource import create_resources_from_crd
 from lightkube.resources.admissionregistration_v1 import (
     MutatingWebhookConfiguration,
     ValidatingWebhookConfiguration,
@@ -42,9 +45,13 @@ from istioctl import Istioctl
 
 LOGGER = logging.getLogger(__name__)
 
+# Use libyaml's C parser for the (large) generated manifests when PyYAML was built with it
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
 SOURCE_PATH = Path(__file__).parent
+MANIFEST_CACHE_DIR = Path("/tmp/istio-manifest-cache")
 
-CONTROL_PLANE_COMPONENTS = ["pilot", "cni", "ztunnel"]
+CONTROL_PLANE_COMPONENTS = ("pilot", "cni", "ztunnel")
 CONTROL_PLANE_LABEL = "control-plane"
 CONTROL_PLANE_RESOURCE_TYPES = {
     ClusterRole,
@@ -61,12 +68,27 @@ CONTROL_PLANE_RESOURCE_TYPES = {
     ServiceAccount,
     ValidatingWebhookConfiguration,
 }
-ISTIO_CRDS_COMPONENTS = ["base"]
+ISTIO_CRDS_COMPONENTS = ("base",)
 ISTIO_CRDS_LABEL = "istio-crds"
 ISTIO_CRDS_RESOURCE_TYPES = {CustomResourceDefinition}
-GATEWAY_API_CRDS_MANIFEST = [SOURCE_PATH / "manifests" / "gateway-apis-crds.yaml"]
+GATEWAY_API_CRDS_MANIFEST = (SOURCE_PATH / "manifests" / "gateway-apis-crds.yaml",)
 GATEWAY_API_CRDS_LABEL = "gateway-apis-crds"
 GATEWAY_API_CRDS_RESOURCE_TYPES = {CustomResourceDefinition}
+SIDECAR_EXCLUDE_OUTBOUND_IP_RANGES_KEY = r"values.sidecarInjectorWebhook.injectedAnnotations.traffic\.sidecar\.istio\.io/excludeOutboundIPRanges"
+# Workloads whose pods are labelled for metrics aggregation by the metrics proxy
+TELEMETRY_WORKLOAD_KINDS = ("DaemonSet", "Deployment")
+TELEMETRY_WORKLOAD_NAMES = frozenset({"ztunnel", "istio-cni-node", "istiod"})
+# IstioOperator settings that do not depend on the charm's config or relations
+ISTIOCTL_STATIC_SETTING_OVERRIDES = {
+    # Enable Envoy access logs
+    # (see https://istio.io/latest/docs/tasks/observability/logs/access-log/)
+    "meshConfig.accessLogFile": "/dev/stdout",
+    # Configure the sidecar injector to exclude outbound traffic to all IP ranges.  This is a
+    # workaround for CNI limitations with init containers
+    # (https://istio.io/latest/docs/setup/additional-setup/cni/#compatibility-with-application-init-containers)
+    # This can be removed if we drop support for sidecars
+    SIDECAR_EXCLUDE_OUTBOUND_IP_RANGES_KEY: "0.0.0.0/0",
+}
 
 
 @trace_charm(
@@ -85,15 +107,25 @@ class IstioCoreCharm(ops.CharmBase):
     def __init__(self, *args):
         super().__init__(*args)
         self._parsed_config = None
+        self._reconciled_setting_overrides = None
         self._resource_manager_factories = {
             CONTROL_PLANE_LABEL: self._get_control_plane_kubernetes_resource_manager,
             ISTIO_CRDS_LABEL: self._get_crds_kubernetes_resource_manager,
             GATEWAY_API_CRDS_LABEL: self._get_gateway_apis_kubernetes_resource_manager,
         }
+        self._resource_managers: Dict[str, KubernetesResourceManager] = {}
         self.telemetry_labels = {
             f"charms.canonical.com/{self.model.name}.{self.app.name}.telemetry": "aggregated"
         }
+        self._telemetry_labels_items = tuple(self.telemetry_labels.items())
+        self._telemetry_labels_str = self.format_labels(self.telemetry_labels)
         self._lightkube_field_manager: str = self.app.name
+        self._resource_manager_labels = {
+            resource_group: create_charm_default_labels(
+                self.app.name, self.model.name, scope=resource_group
+            )
+            for resource_group in self._resource_manager_factories
+        }
 
         # Configure Observability
         self._scraping = MetricsEndpointProvider(
@@ -114,7 +146,9 @@ class IstioCoreCharm(ops.CharmBase):
 
         self.framework.observe(self.on.config_changed, self._reconcile)
         self.framework.observe(self.on.remove, self._remove)
-        self.framework.observe(self.on.metrics_proxy_pebble_ready, self._reconcile)
+        self.framework.observe(
+            self.on.metrics_proxy_pebble_ready, self._on_metrics_proxy_pebble_ready
+        )
         self.framework.observe(self.workload_tracing.on.endpoint_changed, self._reconcile)
         self.framework.observe(self.workload_tracing.on.endpoint_removed, self._reconcile)
 
@@ -131,13 +165,24 @@ class IstioCoreCharm(ops.CharmBase):
                     "metrics-proxy": {
                         "override": "replace",
                         "summary": "Metrics Broadcast Proxy",
-                        "command": f"metrics-proxy --labels {self.format_labels(self.telemetry_labels)}",
+                        "command": f"metrics-proxy --labels {self._telemetry_labels_str}",
                         "startup": "enabled",
                     }
                 },
             }
         )
 
+        # Skip the Pebble round trips (and any service restart) if the service is already running
+        # as desired
+        current_service = proxy_container.get_plan().services.get("metrics-proxy")
+        desired_service = proxy_layer.services["metrics-proxy"]
+        if (
+            current_service is not None
+            and current_service.to_dict() == desired_service.to_dict()
+            and proxy_container.get_service("metrics-proxy").is_running()
+        ):
+            return
+
         proxy_container.add_layer("metrics-proxy", proxy_layer, combine=True)
 
         try:
@@ -145,11 +190,21 @@ class IstioCoreCharm(ops.CharmBase):
         except ChangeError as e:
             LOGGER.error(f"Error while replanning proxy container: {e}")
 
+    def _on_metrics_proxy_pebble_ready(self, _event: ops.PebbleReadyEvent):
+        """Start the metrics proxy, which is the only thing that depends on its container."""
+        self._setup_proxy_pebble_service()
+
     def _reconcile(self, _event: ops.ConfigChangedEvent):
         """Reconcile the entire state of the charm."""
-        self._reconcile_gateway_api_crds()
-        self._reconcile_istio_crds()
-        self._reconcile_control_plane()
+        # Several observed events (eg: the workload tracing endpoint_changed and endpoint_removed)
+        # can be emitted during the same dispatch.  Skip regenerating and applying the manifests
+        # if their inputs have not changed since we last reconciled them.
+        setting_overrides = self._istioctl_setting_overrides()
+        if setting_overrides != self._reconciled_setting_overrides:
+            self._reconcile_gateway_api_crds()
+            self._reconcile_istio_crds()
+            self._reconcile_control_plane()
+            self._reconciled_setting_overrides = setting_overrides
 
         # Ensure the Pebble service is up-to-date
         self._setup_proxy_pebble_service()
@@ -167,28 +222,31 @@ class IstioCoreCharm(ops.CharmBase):
 
     @property
     def parsed_config(self):
-        """Return a validated and parsed configuration object."""
+        """Return the validated and parsed configuration as a dict, keyed by config option name."""
         if self._parsed_config is None:
             config = dict(self.model.config.items())
-            self._parsed_config = CharmConfig(**config)  # pyright: ignore
-        return self._parsed_config.dict(by_alias=True)
+            self._parsed_config = CharmConfig.model_validate(config).model_dump(by_alias=True)
+        return self._parsed_config
 
-    @property
+    @functools.cached_property
     def lightkube_client(self):
-        """Returns a lightkube client configured for this charm."""
+        """Returns a lightkube client configured for this charm, shared by all its resource managers."""
         return Client(namespace=self.model.name, field_manager=self._lightkube_field_manager)
 
     # Helpers
 
     def _get_resource_manager(self, resource_group: str) -> KubernetesResourceManager:
-        """Return an initialized KubernetesResourceManager for the given resource group."""
-        return self._resource_manager_factories[resource_group]()
+        """Return the KubernetesResourceManager for the given resource group, creating it if needed."""
+        if resource_group not in self._resource_managers:
+            factory = self._resource_manager_factories[resource_group]
+            self._resource_managers[resource_group] = factory()
+        return self._resource_managers[resource_group]
 
     def _reconcile_control_plane(self):
         """Reconcile the control plane resources."""
         ictl = self._get_istioctl()
         manifests = ictl.manifest_generate(components=CONTROL_PLANE_COMPONENTS)
-        resources = codecs.load_all_yaml(manifests, create_resources_for_crds=True)
+        resources = load_manifest(manifests)
 
         resources = self._add_metrics_labels(resources)
 
@@ -202,29 +260,24 @@ class IstioCoreCharm(ops.CharmBase):
         # manifests and remove that resource before passing to KubernetesResourceHandler
         ictl = self._get_istioctl()
         manifests = ictl.manifest_generate(components=ISTIO_CRDS_COMPONENTS)
-        resources = codecs.load_all_yaml(manifests, create_resources_for_crds=True)
-        if resources[-1].kind == "ServiceAccount":
-            resources.pop()
-        else:
-            raise ValueError(
-                f"Expected a ServiceAccount as the last resource in the manifest, found {resources[-1]}"
-            )
+        # Any other unexpected resource is rejected by the resource manager, which only accepts CRDs
+        resources = [
+            resource for resource in load_manifest(manifests) if resource.kind != "ServiceAccount"
+        ]
         krm = self._get_resource_manager(ISTIO_CRDS_LABEL)
         krm.reconcile(resources)  # pyright: ignore
 
     def _reconcile_gateway_api_crds(self):
         """Reconcile the Gateway API CRD resources."""
-        manifests = [manifest_file.read_text() for manifest_file in GATEWAY_API_CRDS_MANIFEST]
-        manifest = "\n---\n".join(manifests) + "\n"
-        resources = codecs.load_all_yaml(manifest, create_resources_for_crds=True)
+        # KubernetesResourceManager copies the resources before adding its labels, so passing it a
+        # copy of the cached list is enough to leave the cached resources untouched
+        resources = list(load_gateway_api_crds())
         krm = self._get_resource_manager(GATEWAY_API_CRDS_LABEL)
         krm.reconcile(resources)  # pyright: ignore
 
     def _get_control_plane_kubernetes_resource_manager(self):
         return KubernetesResourceManager(
-            labels=create_charm_default_labels(
-                self.app.name, self.model.name, scope=CONTROL_PLANE_LABEL
-            ),
+            labels=self._resource_manager_labels[CONTROL_PLANE_LABEL],
             resource_types=CONTROL_PLANE_RESOURCE_TYPES,
             lightkube_client=self.lightkube_client,
             logger=LOGGER,
@@ -232,9 +285,7 @@ class IstioCoreCharm(ops.CharmBase):
 
     def _get_crds_kubernetes_resource_manager(self):
         return KubernetesResourceManager(
-            labels=create_charm_default_labels(
-                self.app.name, self.model.name, scope=ISTIO_CRDS_LABEL
-            ),
+            labels=self._resource_manager_labels[ISTIO_CRDS_LABEL],
             resource_types=ISTIO_CRDS_RESOURCE_TYPES,  # pyright: ignore
             lightkube_client=self.lightkube_client,
             logger=LOGGER,
@@ -242,9 +293,7 @@ class IstioCoreCharm(ops.CharmBase):
 
     def _get_gateway_apis_kubernetes_resource_manager(self):
         return KubernetesResourceManager(
-            labels=create_charm_default_labels(
-                self.app.name, self.model.name, scope=GATEWAY_API_CRDS_LABEL
-            ),
+            labels=self._resource_manager_labels[GATEWAY_API_CRDS_LABEL],
             resource_types=GATEWAY_API_CRDS_RESOURCE_TYPES,  # pyright: ignore
             lightkube_client=self.lightkube_client,
             logger=LOGGER,
@@ -275,56 +324,48 @@ class IstioCoreCharm(ops.CharmBase):
 
     def _get_istioctl(self) -> Istioctl:
         """Return an initialized Istioctl instance."""
+        return Istioctl(
+            istioctl_path="./istioctl",
+            namespace=self.model.name,
+            profile="empty",
+            setting_overrides=self._istioctl_setting_overrides(),
+            manifest_cache_dir=MANIFEST_CACHE_DIR,
+        )
+
+    def _istioctl_setting_overrides(self) -> Dict[str, str]:
+        """Return the IstioOperator setting overrides for the current charm state."""
         # Default settings
-        setting_overrides = {}
+        setting_overrides = dict(ISTIOCTL_STATIC_SETTING_OVERRIDES)
 
         # Configure tracing
         # TODO: If Tempo is on mesh, Istio won't be able to send traces to Tempo until https://github.com/canonical/istio-k8s-operator/issues/30 is fixed
         # (see https://istio.io/latest/docs/tasks/observability/distributed-tracing/opentelemetry/)
         setting_overrides.update(self._workload_tracing_config())
 
-        # Enable Envoy access logs
-        # (see https://istio.io/latest/docs/tasks/observability/logs/access-log/)
-        setting_overrides["meshConfig.accessLogFile"] = "/dev/stdout"
+        config = self.parsed_config
 
         # Ignore the platform setting if it's not set or is empty
-        if self.parsed_config["platform"]:
-            setting_overrides["values.global.platform"] = self.parsed_config["platform"]
-
-        # Configure the sidecar injector to exclude outbound traffic to all IP ranges.  This is a
-        # workaround for CNI limitations with init containers
-        # (https://istio.io/latest/docs/setup/additional-setup/cni/#compatibility-with-application-init-containers)
-        # This can be removed if we drop support for sidecars
-        setting_overrides[
-            r"values.sidecarInjectorWebhook.injectedAnnotations.traffic\.sidecar\.istio\.io/excludeOutboundIPRanges"
-        ] = "0.0.0.0/0"
-
-        if self.parsed_config["ambient"]:
+        if config["platform"]:
+            setting_overrides["values.global.platform"] = config["platform"]
+
+        if config["ambient"]:
             setting_overrides["values.profile"] = "ambient"
 
-        if self.parsed_config["auto-allow-waypoint-policy"]:
+        if config["auto-allow-waypoint-policy"]:
             setting_overrides["values.pilot.env.PILOT_AUTO_ALLOW_WAYPOINT_POLICY"] = "true"
 
-        return Istioctl(
-            istioctl_path="./istioctl",
-            namespace=self.model.name,
-            profile="empty",
-            setting_overrides=setting_overrides,
-        )
+        return setting_overrides
 
     def _add_metrics_labels(self, resources: List[AnyResource]) -> List[AnyResource]:
         """Append extra labels to the ztunnel, istio-cni-node, and istiod pods based on METRICS_LABELS."""
+        telemetry_labels_items = self._telemetry_labels_items
         for resource in resources:
-            if resource.kind in [
-                "DaemonSet",
-                "Deployment",
-            ] and resource.metadata.name in [  # pyright: ignore
-                "ztunnel",
-                "istio-cni-node",
-                "istiod",
-            ]:
-                for key, value in self.telemetry_labels.items():
-                    resource.spec.template.metadata.labels[key] = value  # pyright: ignore
+            if (
+                resource.kind in TELEMETRY_WORKLOAD_KINDS
+                and resource.metadata.name in TELEMETRY_WORKLOAD_NAMES  # pyright: ignore
+            ):
+                pod_labels = resource.spec.template.metadata.labels  # pyright: ignore
+                pod_labels.update(telemetry_labels_items)
 
         return resources
 
@@ -334,5 +375,43 @@ class IstioCoreCharm(ops.CharmBase):
         return ",".join(f"{key}={value}" for key, value in label_dict.items())
 
 
+@functools.lru_cache(maxsize=1)
+def load_gateway_api_crds() -> List[AnyResource]:
+    """Load the Gateway API CRD resources packaged with the charm.
+
+    The manifests are static, so they are read and parsed only once per process.  Callers must not
+    modify the returned list or the resources in it.
+    """
+    manifests = [manifest_file.read_text() for manifest_file in GATEWAY_API_CRDS_MANIFEST]
+    manifest = "\n---\n".join(manifests) + "\n"
+    return load_manifest(manifest)
+
+
+def load_manifest(manifest: str) -> List[AnyResource]:
+    """Load the lightkube resources defined in a multi-document YAML manifest.
+
+    This is equivalent to `lightkube.codecs.load_all_yaml(manifest, create_resources_for_crds=True)`,
+    but parses the YAML with YAML_LOADER instead of always using PyYAML's pure-Python loader.
+    """
+    return _resources_from_dicts(yaml.load_all(manifest, Loader=YAML_LOADER))
+
+
+def _resources_from_dicts(objects: Iterable) -> List[AnyResource]:
+    """Convert parsed YAML documents to lightkube resources, flattening any *List resources."""
+    resources = []
+    for obj in objects:
+        if obj is None:
+            continue
+        if isinstance(obj, dict) and obj.get("kind", "").endswith("List"):
+            resources.extend(_resources_from_dicts(obj.get("items") or []))
+            continue
+
+        resource = codecs.from_dict(obj)
+        resources.append(resource)
+        if resource.kind == "CustomResourceDefinition":
+            create_resources_from_crd(resource)  # pyright: ignore
+    return resources
+
+
 if __name__ == "__main__":
     ops.main.main(IstioCoreCharm)
@@ -1,11 +1,13 @@
 """Configuration parser for the charm."""
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
 class CharmConfig(BaseModel):
     """Manager for the charm configuration."""
 
+    model_config = ConfigDict(populate_by_name=True)
+
     ambient: bool
     platform: str = Field()  # type: ignore
     auto_allow_waypoint_policy: bool = Field(alias="auto-allow-waypoint-policy")  # type: ignore
@@ -1,15 +1,20 @@
 """A python API for operating the istioctl binary."""
 
+import hashlib
+import json
 import logging
+import os
 import subprocess
 import sys
 from itertools import chain
-from typing import Dict, List, Optional
-
-import yaml
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
 
 logger = logging.getLogger(__name__)
 
+# Maximum number of generated manifests kept in the manifest cache
+MANIFEST_CACHE_SIZE = 8
+
 
 class IstioctlError(Exception):
     """Error raised when an istioctl command fails."""
@@ -41,6 +46,7 @@ class Istioctl:
         namespace: Optional[str] = "istio-system",
         profile: Optional[str] = "empty",
         setting_overrides: Optional[Dict[str, str]] = None,
+        manifest_cache_dir: Optional[Path] = None,
     ):
         """Python API for operating the istioctl binary.
 
@@ -53,20 +59,24 @@ class Istioctl:
             setting_overrides (optional, dict): A map of IstioOperator overrides to apply during
                                                 istioctl calls, passed to istioctl as `--set`
                                                 options
+            manifest_cache_dir (optional, Path): A directory in which to cache the output of
+                                                 `manifest_generate`, keyed by the istioctl binary
+                                                 and the arguments passed to it.  If undefined,
+                                                 manifests are always generated by istioctl.
         """
         self._istioctl_path = istioctl_path
         self._namespace = namespace
         self._profile = profile
         self._setting_overrides = setting_overrides if setting_overrides is not None else {}
+        self._manifest_cache_dir = manifest_cache_dir
 
-    @property
-    def _args(self) -> List[str]:
+        # The settings are fixed at construction, so build their `--set` arguments once
         settings = {
             "profile": self._profile,
             "values.global.istioNamespace": self._namespace,
         }
         settings.update(self._setting_overrides)
-        return settings_dict_to_args(settings)
+        self._args = settings_dict_to_args(settings)
 
     def install(self):
         """Install Istio using the `istioctl install` command."""
@@ -74,11 +84,11 @@ class Istioctl:
         args = ["install", "-y", *self._args]
         self._run(*args)
 
-    def manifest_generate(self, components: Optional[List[str]] = None) -> str:
+    def manifest_generate(self, components: Optional[Sequence[str]] = None) -> str:
         """Generate Istio's manifests using the `istioctl manifest generate` command.
 
         Args:
-            components: An optional list of Istio components to enable by passing the argument
+            components: An optional sequence of Istio components to enable by passing the argument
                         `--set components.COMPONENT.enabled=true`.  See
                         https://istio.io/latest/docs/setup/additional-setup/customize-installation/
                         for more details. If undefined, no components will be added and only those components included
@@ -95,7 +105,64 @@ class Istioctl:
             ("--set", f"components.{component}.enabled=true") for component in components
         )
         args = ["manifest", "generate", *self._args, *components_args]
-        return self._run(*args)
+        cache_file = self._manifest_cache_file(args)
+        if cache_file is None:
+            return self._run(*args)
+
+        try:
+            manifest = cache_file.read_text()
+        except OSError:
+            manifest = self._run(*args)
+            self._write_manifest_cache(cache_file, manifest)
+        else:
+            logger.debug(f"Using cached manifest {cache_file}")
+            # Mark the entry as recently used so it is the last to be evicted
+            cache_file.touch()
+        return manifest
+
+    def _manifest_cache_file(self, args: List[str]) -> Optional[Path]:
+        """Return the cache file for the output of running istioctl with the given arguments.
+
+        The cache key includes the size and modification time of the istioctl binary so that
+        cached manifests are not reused after istioctl itself is changed (eg: on a charm upgrade).
+
+        Returns None if manifest caching is disabled or the istioctl binary cannot be inspected.
+        """
+        if self._manifest_cache_dir is None:
+            return None
+        try:
+            binary_stat = os.stat(self._istioctl_path)  # pyright: ignore
+        except OSError:
+            return None
+
+        key_data = [
+            self._istioctl_path,
+            binary_stat.st_size,
+            binary_stat.st_mtime_ns,
+            *args,
+        ]
+        key = hashlib.blake2b(json.dumps(key_data).encode(), digest_size=16).hexdigest()
+        return self._manifest_cache_dir / f"{key}.yaml"
+
+    def _write_manifest_cache(self, cache_file: Path, manifest: str):
+        """Store a generated manifest in the cache, evicting the least recently used entries.
+
+        Failing to write the cache is not fatal, as the manifest will be regenerated next time.
+        """
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # Write atomically so that a concurrent reader never sees a partial manifest
+            tmp_file = cache_file.with_suffix(".tmp")
+            tmp_file.write_text(manifest)
+            tmp_file.replace(cache_file)
+
+            cached = sorted(
+                cache_file.parent.glob("*.yaml"), key=lambda path: path.stat().st_mtime_ns
+            )
+            for stale_file in cached[:-MANIFEST_CACHE_SIZE]:
+                stale_file.unlink()
+        except OSError as e:
+            logger.warning(f"Failed to write manifest cache {cache_file}: {e}")
 
     def precheck(self):
         """Execute `istioctl x precheck` to validate whether the environment can be updated.
@@ -112,7 +179,9 @@ class Istioctl:
     def _run(self, *args) -> str:
         """Run an istioctl command with the given arguments, logging errors."""
         command = [self._istioctl_path, *args]
-        logger.info(f"Running command: {' '.join(command)}")
+        # Commands can have dozens of arguments, so only format them if they'll be logged
+        if logger.isEnabledFor(logging.INFO):
+            logger.info(f"Running command: {' '.join(command)}")
         try:
             output = subprocess.check_output(command)
         except subprocess.CalledProcessError as cpe:
@@ -149,10 +218,15 @@ class Istioctl:
 
     def version(self) -> dict:
         """Return istio client and control plane versions."""
-        args = ["version", f"-i={self._namespace}", "-o=yaml"]
+        args = ["version", f"-i={self._namespace}", "-o=json"]
         version_string = self._run(*args)
 
-        version_dict = yaml.safe_load(version_string)
+        try:
+            version_dict = json.loads(version_string)
+        except json.JSONDecodeError as e:
+            raise IstioctlError(
+                f"Failed to parse istioctl version output: {version_string!r}"
+            ) from e
         return {
             "client": get_client_version(version_dict),
             "control_plane": get_control_plane_version(version_dict),
@@ -163,7 +237,7 @@ def get_client_version(version_dict: dict) -> str:
     """Return the client version from a dict of `istioctl version` output.
 
     Args:
-        version_dict (dict): A dict of the version output from `istioctl version -o yaml`
+        version_dict (dict): A dict of the version output from `istioctl version -o json`
 
     Returns:
         (str) The client version
@@ -180,7 +254,7 @@ def get_control_plane_version(version_dict: dict) -> str:
     """Return the control plane version from a dict of `istioctl version` output.
 
     Args:
-        version_dict (dict): A dict of the version output from `istioctl version -o yaml`
+        version_dict (dict): A dict of the version output from `istioctl version -o json`
 
     Returns:
         (str) The control plane version
@@ -2,7 +2,6 @@
 # See LICENSE file for licensing details.
 import functools
 import logging
-from collections import defaultdict
 from datetime import datetime
 
 import pytest
@@ -10,10 +9,7 @@ import pytest
 logger = logging.getLogger(__name__)
 
 
-class Store(defaultdict):
-    def __init__(self):
-        super(Store, self).__init__(Store)
-
+class Store(dict):
     def __getattr__(self, key):
         """Override __getattr__ so dot syntax works on keys."""
         try:
@@ -35,7 +31,7 @@ def timed_memoizer(func):
         fname = func.__qualname__
         logger.info("Started: %s" % fname)
         start_time = datetime.now()
-        if fname in store.keys():
+        if fname in store:
             ret = store[fname]
         else:
             logger.info("Return for {} not cached".format(fname))
@@ -3,7 +3,7 @@
 # See LICENSE file for licensing details.
 
 import asyncio
-import dataclasses
+import functools
 import logging
 from collections import namedtuple
 from pathlib import Path
@@ -80,8 +80,15 @@ async def test_removal(ops_test: OpsTest):
     assert do_istio_crds_exist_result.success is False, "istio CRDs still exist"
 
 
-@dataclasses.dataclass
+@functools.lru_cache(maxsize=1)
+def get_lightkube_client() -> Client:
+    """Return a lightkube Client shared by all the assertion helpers."""
+    return Client()
+
+
 class BoolTestResult:
+    __slots__ = ("success", "message")
+
     def __init__(self, success: bool, message: str = ""):
         self.success = success
         self.message = message
@@ -93,7 +100,7 @@ class BoolTestResult:
 
 def is_istiod_up(namespace: str) -> BoolTestResult:
     """Assert that the Istiod deployment is up and running."""
-    lc = Client()
+    lc = get_lightkube_client()
     try:
         istiod = lc.get(Deployment, namespace=namespace, name="istiod")
     except ApiError as e:
@@ -135,7 +142,7 @@ def do_gateway_api_crds_exist() -> BoolTestResult:
 
 def do_crds_exist(crd_names: List[str]) -> BoolTestResult:
     """Assert that all CRDs of the given names exist."""
-    lc = Client()
+    lc = get_lightkube_client()
     for name in crd_names:
         try:
             lc.get(CustomResourceDefinition, name=name)
@@ -148,27 +155,32 @@ def do_crds_exist(crd_names: List[str]) -> BoolTestResult:
 
 def does_env_include_key_value(env: List[EnvVar], key: str, value: str) -> bool:
     """Return True if the envs list includes an env with the given key and value, else False."""
-    return any(True for env in env if env.name == key and env.value == value)
+    return any(env_var.name == key and env_var.value == value for env_var in env)
+
+
+AmbientTestCase = namedtuple("AmbientTestCase", ["name", "key", "value", "resource_type"])
+AMBIENT_TEST_CASES = (
+    AmbientTestCase(
+        name="ztunnel", key="ISTIO_META_ENABLE_HBONE", value="true", resource_type=DaemonSet
+    ),
+    AmbientTestCase(
+        name="istiod", key="PILOT_ENABLE_AMBIENT", value="true", resource_type=Deployment
+    ),
+)
 
 
 def is_ambient_mode_enabled(namespace: str) -> BoolTestResult:
     """Assert that Istio's ambient mode is enabled."""
-    lc = Client()
-
-    case = namedtuple("ambient_test_case", ["name", "key", "value", "resource_type"])
-    cases = [
-        case(name="ztunnel", key="ISTIO_META_ENABLE_HBONE", value="true", resource_type=DaemonSet),
-        case(name="istiod", key="PILOT_ENABLE_AMBIENT", value="true", resource_type=Deployment),
-    ]
+    lc = get_lightkube_client()
 
-    for case in cases:
-        component = lc.get(case.resource_type, namespace=namespace, name=case.name)
+    for test_case in AMBIENT_TEST_CASES:
+        component = lc.get(test_case.resource_type, namespace=namespace, name=test_case.name)
         if not does_env_include_key_value(
-            component.spec.template.spec.containers[0].env, case.key, case.value
+            component.spec.template.spec.containers[0].env, test_case.key, test_case.value
         ):
             return BoolTestResult(
                 success=False,
-                message=f"Ambient mode is not enabled - {case.name}'s {case.key} env var is not set to {case.value}",
+                message=f"Ambient mode is not enabled - {test_case.name}'s {test_case.key} env var is not set to {test_case.value}",
             )
 
     # Assert istio-cni is configured for ambient mode
@@ -185,7 +197,7 @@ def is_ambient_mode_enabled(namespace: str) -> BoolTestResult:
 
 def is_ztunnel_up(namespace: str) -> BoolTestResult:
     """Assert that Istio's ztunnel mode is enabled."""
-    lc = Client()
+    lc = get_lightkube_client()
     ds = lc.get(DaemonSet, namespace=namespace, name="ztunnel")
     return is_daemonset_ready(ds)
 
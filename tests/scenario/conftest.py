@@ -2,7 +2,7 @@
 # Copyright 2024 Canonical Ltd.
 # See LICENSE file for licensing details.
 import json
-from unittest.mock import patch
+from unittest.mock import DEFAULT, patch
 
 import pytest
 from charms.tempo_coordinator_k8s.v0 import charm_tracing
@@ -10,21 +10,33 @@ from scenario import Context, Relation
 
 from src.charm import IstioCoreCharm
 
+WORKLOAD_TRACING_REMOTE_RECEIVERS = json.dumps(
+    [
+        {
+            "protocol": {"name": "otlp_grpc", "type": "grpc"},
+            "url": "endpoint.namespace.svc.cluster.local:4317",
+        }
+    ]
+)
+WORKLOAD_TRACING_LOCAL_RECEIVERS = json.dumps(["otlp_grpc"])
 
-@pytest.fixture(autouse=True)
+
+@pytest.fixture()
 def charm_tracing_buffer_to_tmp(tmp_path):
     with patch.object(charm_tracing, "BUFFER_DEFAULT_CACHE_FILE_NAME", tmp_path):
         yield
 
 
 @pytest.fixture()
-def istio_core_charm():
-    # TODO: Python 3.10 lets you have multiple context managers in a single with statement
-    with patch.object(IstioCoreCharm, "_reconcile_control_plane"):
-        with patch.object(IstioCoreCharm, "_reconcile_istio_crds"):
-            with patch.object(IstioCoreCharm, "_reconcile_gateway_api_crds"):
-                with patch.object(IstioCoreCharm, "_setup_proxy_pebble_service"):
-                    yield IstioCoreCharm
+def istio_core_charm(charm_tracing_buffer_to_tmp):
+    with patch.multiple(
+        IstioCoreCharm,
+        _reconcile_control_plane=DEFAULT,
+        _reconcile_istio_crds=DEFAULT,
+        _reconcile_gateway_api_crds=DEFAULT,
+        _setup_proxy_pebble_service=DEFAULT,
+    ):
+        yield IstioCoreCharm
 
 
 @pytest.fixture()
@@ -32,19 +44,10 @@ def istio_core_context(istio_core_charm):
     yield Context(charm_type=istio_core_charm)
 
 
-@pytest.fixture(scope="function")
+@pytest.fixture(scope="session")
 def workload_tracing():
     return Relation(
         "workload-tracing",
-        remote_app_data={
-            "receivers": json.dumps(
-                [
-                    {
-                        "protocol": {"name": "otlp_grpc", "type": "grpc"},
-                        "url": "endpoint.namespace.svc.cluster.local:4317",
-                    }
-                ]
-            )
-        },
-        local_app_data={"receivers": json.dumps(["otlp_grpc"])},
+        remote_app_data={"receivers": WORKLOAD_TRACING_REMOTE_RECEIVERS},
+        local_app_data={"receivers": WORKLOAD_TRACING_LOCAL_RECEIVERS},
     )
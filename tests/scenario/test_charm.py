@@ -9,3 +9,11 @@ def test_start_charm_active(istio_core_context):
     state = State()
     out = istio_core_context.run(istio_core_context.on.config_changed(), state)
     assert out.unit_status.name == "active"
+
+
+def test_reconcile_gate_does_not_persist_across_dispatches(istio_core_charm, istio_core_context):
+    """Assert that an unchanged config is reconciled again by a later dispatch."""
+    state = istio_core_context.run(istio_core_context.on.config_changed(), State())
+    istio_core_context.run(istio_core_context.on.config_changed(), state)
+
+    assert istio_core_charm._reconcile_control_plane.call_count == 2
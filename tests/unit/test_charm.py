@@ -3,15 +3,25 @@
 #
 # Learn more about testing at: https://juju.is/docs/sdk/testing
 
-from unittest.mock import MagicMock, patch
+from unittest.mock import DEFAULT, MagicMock, patch
 
 import ops
 import ops.testing
 import pytest
+from charms.tempo_coordinator_k8s.v0 import charm_tracing
+from lightkube import codecs
+from lightkube.resources.apps_v1 import DaemonSet, Deployment
 from lightkube_extensions.batch import KubernetesResourceManager
 from ops.model import ActiveStatus
 
-from charm import IstioCoreCharm
+from charm import GATEWAY_API_CRDS_MANIFEST, IstioCoreCharm, load_manifest
+
+SERVICE_ACCOUNT_MANIFEST = """
+apiVersion: v1
+kind: ServiceAccount
+metadata:
+  name: istio-reader-service-account
+"""
 
 
 class MockKubernetesResourceManager(KubernetesResourceManager):
@@ -22,24 +32,22 @@ class MockKubernetesResourceManager(KubernetesResourceManager):
 
 
 @pytest.fixture()
-def harness():
-    harness = ops.testing.Harness(IstioCoreCharm)
-    harness.set_model_name("istio-system")
-    yield harness
-    harness.cleanup()
+def harness(tmp_path):
+    with patch.object(charm_tracing, "BUFFER_DEFAULT_CACHE_FILE_NAME", tmp_path):
+        harness = ops.testing.Harness(IstioCoreCharm)
+        harness.set_model_name("istio-system")
+        yield harness
+        harness.cleanup()
 
 
 class TestCharm:
-    @patch.object(IstioCoreCharm, "_reconcile_gateway_api_crds")
-    @patch.object(IstioCoreCharm, "_reconcile_istio_crds")
-    @patch.object(IstioCoreCharm, "_reconcile_control_plane")
-    def test_charm_begins_active(
-        self,
-        _reconcile_control_plane,
-        _reconcile_istio_crds,
-        _reconcile_gateway_api_crds,
-        harness,
-    ):
+    @patch.multiple(
+        IstioCoreCharm,
+        _reconcile_control_plane=DEFAULT,
+        _reconcile_istio_crds=DEFAULT,
+        _reconcile_gateway_api_crds=DEFAULT,
+    )
+    def test_charm_begins_active(self, harness, **_):
         harness.begin_with_initial_hooks()
 
         assert isinstance(harness.charm.unit.status, ActiveStatus)
@@ -51,3 +59,122 @@ class TestCharm:
         parsed_config = harness.charm.parsed_config
         # Assert an example config is as expected
         assert parsed_config["ambient"]
+
+    @patch.multiple(
+        IstioCoreCharm,
+        _reconcile_control_plane=DEFAULT,
+        _reconcile_istio_crds=DEFAULT,
+        _reconcile_gateway_api_crds=DEFAULT,
+        _setup_proxy_pebble_service=DEFAULT,
+        _istioctl_setting_overrides=DEFAULT,
+    )
+    def test_reconcile_skips_unchanged_setting_overrides(self, harness, **mocks):
+        """Assert that the manifests are only reconciled again in a dispatch once their inputs change."""
+        mocks["_istioctl_setting_overrides"].return_value = {"values.pilot.env.A": "1"}
+        harness.begin()
+
+        harness.charm._reconcile(None)
+        harness.charm._reconcile(None)
+        assert mocks["_reconcile_control_plane"].call_count == 1
+
+        mocks["_istioctl_setting_overrides"].return_value = {"values.pilot.env.A": "2"}
+        harness.charm._reconcile(None)
+        assert mocks["_reconcile_control_plane"].call_count == 2
+
+    @patch.object(IstioCoreCharm, "_get_resource_manager")
+    @patch("charm.Istioctl.manifest_generate")
+    def test_reconcile_istio_crds_drops_service_account(
+        self, manifest_generate, _get_resource_manager, harness
+    ):
+        """Assert that the ServiceAccount istioctl adds to the base manifest is not reconciled."""
+        manifest_generate.return_value = (
+            SERVICE_ACCOUNT_MANIFEST + "\n---\n" + GATEWAY_API_CRDS_MANIFEST[0].read_text()
+        )
+        harness.begin()
+
+        harness.charm._reconcile_istio_crds()
+
+        resources = _get_resource_manager.return_value.reconcile.call_args.args[0]
+        assert resources
+        assert all(resource.kind == "CustomResourceDefinition" for resource in resources)
+
+    @patch.object(IstioCoreCharm, "_reconcile_control_plane")
+    @patch.object(IstioCoreCharm, "_setup_proxy_pebble_service")
+    def test_pebble_ready_only_sets_up_proxy(
+        self, _setup_proxy_pebble_service, _reconcile_control_plane, harness
+    ):
+        harness.begin()
+
+        harness.container_pebble_ready("metrics-proxy")
+
+        _setup_proxy_pebble_service.assert_called_once()
+        _reconcile_control_plane.assert_not_called()
+
+    def test_setup_proxy_pebble_service_skips_unchanged_layer(self, harness):
+        """Assert that the proxy layer is only replanned when it is missing or changed."""
+        harness.set_can_connect("metrics-proxy", True)
+        harness.begin()
+        harness.charm._setup_proxy_pebble_service()
+        container = harness.charm.unit.get_container("metrics-proxy")
+        assert container.get_service("metrics-proxy").is_running()
+
+        with patch.object(ops.Container, "replan") as replan:
+            harness.charm._setup_proxy_pebble_service()
+            replan.assert_not_called()
+
+            harness.charm._telemetry_labels_str = "changed=label"
+            harness.charm._setup_proxy_pebble_service()
+            replan.assert_called_once()
+
+    def test_add_metrics_labels(self, harness):
+        """Assert that only the istio workloads' pod templates get the telemetry labels."""
+        harness.begin()
+        ztunnel = DaemonSet.from_dict(
+            {
+                "metadata": {"name": "ztunnel"},
+                "spec": {
+                    "selector": {"matchLabels": {"app": "ztunnel"}},
+                    "template": {"metadata": {"labels": {"app": "ztunnel"}}},
+                },
+            }
+        )
+        other = Deployment.from_dict(
+            {
+                "metadata": {"name": "other"},
+                "spec": {
+                    "selector": {"matchLabels": {"app": "other"}},
+                    "template": {"metadata": {"labels": {"app": "other"}}},
+                },
+            }
+        )
+
+        resources = harness.charm._add_metrics_labels([ztunnel, other])
+
+        assert resources[0].spec.template.metadata.labels == {
+            "app": "ztunnel",
+            **harness.charm.telemetry_labels,
+        }
+        assert resources[1].spec.template.metadata.labels == {"app": "other"}
+
+
+def test_load_manifest_matches_lightkube():
+    """Assert that load_manifest loads the same resources as lightkube's load_all_yaml."""
+    manifest = GATEWAY_API_CRDS_MANIFEST[0].read_text()
+    manifest += """
+---
+apiVersion: v1
+kind: ConfigMapList
+items:
+  - apiVersion: v1
+    kind: ConfigMap
+    metadata:
+      name: cm1
+  - apiVersion: v1
+    kind: ConfigMap
+    metadata:
+      name: cm2
+"""
+
+    expected = codecs.load_all_yaml(manifest, create_resources_for_crds=True)
+
+    assert load_manifest(manifest) == expected
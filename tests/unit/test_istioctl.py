@@ -1,3 +1,5 @@
+import json
+import subprocess
 import sys
 from pathlib import Path
 from subprocess import CalledProcessError
@@ -8,6 +10,7 @@ import yaml
 from jinja2 import Environment, FileSystemLoader
 
 from istioctl import (
+    MANIFEST_CACHE_SIZE,
     Istioctl,
     IstioctlError,
     get_client_version,
@@ -19,20 +22,69 @@ ISTIOCTL_BINARY = "not_really_istioctl"
 NAMESPACE = "placeholder-namespace"
 PROFILE = "my-profile"
 TEST_DATA_PATH = Path(__file__).parent / "istioctl_data"
+JINJA_ENVIRONMENT = Environment(loader=FileSystemLoader(TEST_DATA_PATH))
+VERSION_OUTPUT_TEMPLATE = JINJA_ENVIRONMENT.get_template(
+    "istioctl_version_output_template.yaml.j2"
+)
+# The encoding Istioctl decodes istioctl's output with
+STDOUT_ENCODING = sys.stdout.encoding
+EXPECTED_CLIENT_VERSION = "1.2.3"
+EXPECTED_CONTROL_PLANE_VERSION = "4.5.6"
+# istioctl is asked for JSON, which has the same structure as the YAML templates
+VERSION_OUTPUT = json.dumps(
+    yaml.safe_load(
+        VERSION_OUTPUT_TEMPLATE.render(
+            client_version=EXPECTED_CLIENT_VERSION,
+            control_version=EXPECTED_CONTROL_PLANE_VERSION,
+        )
+    )
+).encode(STDOUT_ENCODING)
+CLIENT_ONLY_VERSION_OUTPUT = yaml.safe_load(
+    VERSION_OUTPUT_TEMPLATE.render(client_version="1.2.3", control_version="None")
+)
+CONTROL_PLANE_ONLY_VERSION_OUTPUT = yaml.safe_load(
+    VERSION_OUTPUT_TEMPLATE.render(client_version="None", control_version="3.2.1")
+)
+TOO_MANY_MESHES_VERSION_OUTPUT = yaml.safe_load(
+    (TEST_DATA_PATH / "istioctl_version_output_too_many_meshes.yaml").read_text()
+)
+NO_PILOT_VERSION_OUTPUT = yaml.safe_load(
+    (TEST_DATA_PATH / "istioctl_version_output_no_pilot_in_control.yaml").read_text()
+)
 EXPECTED_ISTIOCTL_FLAGS = [
     "--set",
     f"profile={PROFILE}",
     "--set",
     f"values.global.istioNamespace={NAMESPACE}",
 ]
+SETTING_OVERRIDES = {"k1": "v1"}
+EXPECTED_SETTING_OVERRIDE_FLAGS = ["--set", "k1=v1"]
+EXPECTED_INSTALL_ARGS = [ISTIOCTL_BINARY, "install", "-y", *EXPECTED_ISTIOCTL_FLAGS]
+EXPECTED_MANIFEST_GENERATE_ARGS = [
+    ISTIOCTL_BINARY,
+    "manifest",
+    "generate",
+    *EXPECTED_ISTIOCTL_FLAGS,
+]
+EXPECTED_UPGRADE_ARGS = [ISTIOCTL_BINARY, "upgrade", "-y", *EXPECTED_ISTIOCTL_FLAGS]
+EXPECTED_UNINSTALL_ARGS = [ISTIOCTL_BINARY, "uninstall", "--purge", "-y"]
+EXPECTED_PRECHECK_ARGS = [ISTIOCTL_BINARY, "x", "precheck"]
 
 
-# autouse to ensure we don't accidentally call out, but
-# can also be used explicitly to get access to the mock.
+# autouse to ensure we don't accidentally call out.  Tests that run istioctl use
+# mocked_check_output instead, which replaces this with a mock.
 @pytest.fixture(autouse=True)
-def mocked_check_output(mocker):
-    mocked_check_output = mocker.patch("subprocess.check_output")
-    mocked_check_output.return_value = b"stdout"
+def no_subprocess(monkeypatch):
+    def check_output(command, *args, **kwargs):
+        raise AssertionError(f"Unexpected subprocess call: {command}")
+
+    monkeypatch.setattr(subprocess, "check_output", check_output)
+
+
+@pytest.fixture()
+def mocked_check_output(monkeypatch):
+    mocked_check_output = MagicMock(return_value=b"stdout")
+    monkeypatch.setattr(subprocess, "check_output", mocked_check_output)
 
     yield mocked_check_output
 
@@ -46,190 +98,163 @@ def mocked_check_output_failing(mocked_check_output):
     yield mocked_check_output
 
 
-def test_istioctl_install_no_setting_overrides(mocked_check_output):
-    """Tests that istioctl.install() calls the binary successfully with the expected arguments."""
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
+@pytest.fixture()
+def ictl():
+    """Return an Istioctl with the default test arguments and no setting overrides."""
+    return Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
 
-    ictl.install()
 
-    # Assert that we call istioctl with the expected arguments
-    expected_call_args = [
-        ISTIOCTL_BINARY,
-        "install",
-        "-y",
-    ]
-    expected_call_args.extend(EXPECTED_ISTIOCTL_FLAGS)
+@pytest.mark.parametrize(
+    "method, expected_call_args",
+    [
+        ("install", EXPECTED_INSTALL_ARGS),
+        ("manifest_generate", EXPECTED_MANIFEST_GENERATE_ARGS),
+        ("uninstall", EXPECTED_UNINSTALL_ARGS),
+        ("precheck", EXPECTED_PRECHECK_ARGS),
+        ("upgrade", EXPECTED_UPGRADE_ARGS),
+    ],
+)
+def test_istioctl_command(mocked_check_output, ictl, method, expected_call_args):
+    """Tests that each istioctl command calls the binary with the expected arguments."""
+    getattr(ictl, method)()
 
     mocked_check_output.assert_called_once_with(expected_call_args)
 
 
 def test_istioctl_install_setting_overrides(mocked_check_output):
     """Tests that istioctl.install() calls the binary successfully with the expected arguments."""
-    setting_overrides = {"k1": "v1"}
     ictl = Istioctl(
         istioctl_path=ISTIOCTL_BINARY,
         namespace=NAMESPACE,
         profile=PROFILE,
-        setting_overrides=setting_overrides,
+        setting_overrides=SETTING_OVERRIDES,
     )
 
     ictl.install()
 
     # Assert that we call istioctl with the expected arguments
-    expected_call_args = [
-        ISTIOCTL_BINARY,
-        "install",
-        "-y",
-    ]
-    expected_call_args.extend(EXPECTED_ISTIOCTL_FLAGS)
-    for k, v in setting_overrides.items():
-        expected_call_args.extend(["--set", f"{k}={v}"])
-
-    mocked_check_output.assert_called_once_with(expected_call_args)
-
+    mocked_check_output.assert_called_once_with(
+        [*EXPECTED_INSTALL_ARGS, *EXPECTED_SETTING_OVERRIDE_FLAGS]
+    )
 
-def test_istioctl_install_error(mocked_check_output_failing):
-    """Tests that istioctl.install() calls the binary successfully with the expected arguments."""
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
 
-    # Assert that we raise an error when istioctl fails
-    with pytest.raises(IstioctlError):
-        ictl.install()
+@pytest.mark.parametrize(
+    "method, subcommand",
+    [
+        ("install", "install"),
+        ("manifest_generate", "manifest generate"),
+        ("uninstall", "uninstall"),
+        ("precheck", "x precheck"),
+        ("upgrade", "upgrade"),
+        ("version", "version"),
+    ],
+)
+def test_istioctl_error(mocked_check_output_failing, ictl, method, subcommand):
+    """Tests that each istioctl command raises an IstioctlError naming the command when it fails."""
+    with pytest.raises(IstioctlError) as exception_info:
+        getattr(ictl, method)()
 
+    # Check if we failed for the right reason
+    assert f"{ISTIOCTL_BINARY} {subcommand}" in exception_info.value.args[0]
 
-def test_istioctl_manifest(mocked_check_output):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
 
+def test_istioctl_manifest(mocked_check_output, ictl):
     manifest = ictl.manifest_generate()
 
-    # Assert that we call istioctl with the expected arguments
-    expected_call_args = [
-        ISTIOCTL_BINARY,
-        "manifest",
-        "generate",
-    ]
-    expected_call_args.extend(EXPECTED_ISTIOCTL_FLAGS)
-
-    mocked_check_output.assert_called_once_with(expected_call_args)
-
     # Assert that we received the expected manifests from istioctl
     expected_manifest = "stdout"
     assert manifest == expected_manifest
 
 
 def test_istioctl_manifest_with_setting_overrides_and_components(mocked_check_output):
-    setting_overrides = {"k1": "v1"}
     ictl = Istioctl(
         istioctl_path=ISTIOCTL_BINARY,
         namespace=NAMESPACE,
         profile=PROFILE,
-        setting_overrides=setting_overrides,
+        setting_overrides=SETTING_OVERRIDES,
     )
-    components = ["c1", "c2"]
-
-    ictl.manifest_generate(components=components)
+    ictl.manifest_generate(components=["c1", "c2"])
 
     # Assert that we call istioctl with the expected arguments
-    expected_call_args = [
-        ISTIOCTL_BINARY,
-        "manifest",
-        "generate",
-    ]
-    expected_call_args.extend(EXPECTED_ISTIOCTL_FLAGS)
-    for k, v in setting_overrides.items():
-        expected_call_args.extend(["--set", f"{k}={v}"])
-    for c in components:
-        expected_call_args.extend(["--set", f"components.{c}.enabled=true"])
-
-    mocked_check_output.assert_called_once_with(expected_call_args)
-
-
-def test_istioctl_manifest_error(mocked_check_output_failing):
-    """Tests that istioctl.install() calls the binary successfully with the expected arguments."""
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
-
-    # Assert that we raise an error when istioctl fails
-    with pytest.raises(IstioctlError):
-        ictl.manifest_generate()
+    mocked_check_output.assert_called_once_with(
+        [
+            *EXPECTED_MANIFEST_GENERATE_ARGS,
+            *EXPECTED_SETTING_OVERRIDE_FLAGS,
+            "--set",
+            "components.c1.enabled=true",
+            "--set",
+            "components.c2.enabled=true",
+        ]
+    )
 
 
 @pytest.fixture()
-def mocked_lightkube_client(mocker):
-    mocked_lightkube_client = MagicMock()
-    mocked_lightkube_client_class = mocker.patch("istioctl.Client")
-    mocked_lightkube_client_class.return_value = mocked_lightkube_client
-
-    yield mocked_lightkube_client
+def istioctl_binary(tmp_path):
+    """Return the path to a placeholder istioctl binary that can be stat'd for the manifest cache."""
+    istioctl_binary = tmp_path / "istioctl"
+    istioctl_binary.write_text("")
+    return str(istioctl_binary)
 
 
-def test_istioctl_remove(mocked_check_output):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
-
-    ictl.uninstall()
-
-    mocked_check_output.assert_called_once_with([ISTIOCTL_BINARY, "uninstall", "--purge", "-y"])
-
-
-def test_istioctl_remove_error(mocked_check_output_failing):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
-
-    with pytest.raises(IstioctlError):
-        ictl.uninstall()
-
-
-def test_istioctl_precheck(mocked_check_output):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
-
-    ictl.precheck()
-
-    mocked_check_output.assert_called_once_with([ISTIOCTL_BINARY, "x", "precheck"])
-
-
-def test_istioctl_precheck_error(mocked_check_output_failing):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
-
-    with pytest.raises(IstioctlError):
-        ictl.precheck()
+def test_istioctl_manifest_cache_hit(mocked_check_output, istioctl_binary, tmp_path):
+    """Tests that manifest_generate reuses a cached manifest for identical arguments."""
+    cache_dir = tmp_path / "cache"
+    ictl = Istioctl(
+        istioctl_path=istioctl_binary,
+        namespace=NAMESPACE,
+        profile=PROFILE,
+        manifest_cache_dir=cache_dir,
+    )
 
+    first_manifest = ictl.manifest_generate(components=["c1"])
+    second_manifest = ictl.manifest_generate(components=["c1"])
 
-def test_istioctl_upgrade(mocked_check_output):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
+    mocked_check_output.assert_called_once()
+    assert first_manifest == second_manifest == "stdout"
+    assert len(list(cache_dir.glob("*.yaml"))) == 1
 
-    ictl.upgrade()
 
-    expected_call_args = [
-        ISTIOCTL_BINARY,
-        "upgrade",
-        "-y",
-    ]
-    expected_call_args.extend(EXPECTED_ISTIOCTL_FLAGS)
+def test_istioctl_manifest_cache_miss_on_changed_arguments(
+    mocked_check_output, istioctl_binary, tmp_path
+):
+    """Tests that manifest_generate does not reuse a cached manifest generated from other inputs."""
+    cache_dir = tmp_path / "cache"
+    Istioctl(
+        istioctl_path=istioctl_binary,
+        namespace=NAMESPACE,
+        profile=PROFILE,
+        manifest_cache_dir=cache_dir,
+    ).manifest_generate(components=["c1"])
+    Istioctl(
+        istioctl_path=istioctl_binary,
+        namespace=NAMESPACE,
+        profile=PROFILE,
+        setting_overrides={"k1": "v1"},
+        manifest_cache_dir=cache_dir,
+    ).manifest_generate(components=["c1"])
 
-    mocked_check_output.assert_called_once_with(expected_call_args)
+    assert mocked_check_output.call_count == 2
 
 
-def test_istioctl_upgrade_error(mocked_check_output_failing):
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
+def test_istioctl_manifest_cache_eviction(mocked_check_output, istioctl_binary, tmp_path):
+    """Tests that the manifest cache keeps at most MANIFEST_CACHE_SIZE entries."""
+    cache_dir = tmp_path / "cache"
+    ictl = Istioctl(
+        istioctl_path=istioctl_binary,
+        namespace=NAMESPACE,
+        profile=PROFILE,
+        manifest_cache_dir=cache_dir,
+    )
 
-    with pytest.raises(IstioctlError) as exception_info:
-        ictl.upgrade()
+    for i in range(MANIFEST_CACHE_SIZE + 2):
+        ictl.manifest_generate(components=[f"c{i}"])
 
-    # Check if we failed for the right reason
-    assert "istioctl upgrade" in exception_info.value.args[0]
+    assert len(list(cache_dir.glob("*.yaml"))) == MANIFEST_CACHE_SIZE
 
 
-def test_istioctl_version(mocked_check_output):
+def test_istioctl_version(mocked_check_output, ictl):
     """Test that istioctl.version() returns successfully when expected."""
-    expected_client_version = "1.2.3"
-    expected_control_version = "4.5.6"
-    environment = Environment(loader=FileSystemLoader(TEST_DATA_PATH))
-    template = environment.get_template("istioctl_version_output_template.yaml.j2")
-    istioctl_version_output_str = template.render(
-        client_version=expected_client_version,
-        control_version=expected_control_version,
-    )
-    mocked_check_output.return_value = istioctl_version_output_str.encode(sys.stdout.encoding)
-
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
+    mocked_check_output.return_value = VERSION_OUTPUT
 
     version_data = ictl.version()
 
@@ -238,46 +263,25 @@ def test_istioctl_version(mocked_check_output):
             ISTIOCTL_BINARY,
             "version",
             f"-i={NAMESPACE}",
-            "-o=yaml",
+            "-o=json",
         ]
     )
 
-    assert version_data["client"] == expected_client_version
-    assert version_data["control_plane"] == expected_control_version
+    assert version_data["client"] == EXPECTED_CLIENT_VERSION
+    assert version_data["control_plane"] == EXPECTED_CONTROL_PLANE_VERSION
 
 
-def test_istioctl_version_no_versions(mocked_check_output):
+def test_istioctl_version_no_versions(mocked_check_output, ictl):
     """Test that istioctl.version() returns successfully when expected."""
     # Mock with empty return
-    mocked_check_output.return_value = "".encode(sys.stdout.encoding)
-
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
-
-    with pytest.raises(IstioctlError):
-        ictl.version()
-
-
-def test_istioctl_version_istioctl_command_fails(mocked_check_output_failing):
-    """Test that istioctl.version() returns successfully when expected."""
-    ictl = Istioctl(istioctl_path=ISTIOCTL_BINARY, namespace=NAMESPACE, profile=PROFILE)
+    mocked_check_output.return_value = b""
 
     with pytest.raises(IstioctlError):
         ictl.version()
 
 
 def test_get_client_version():
-    client_version = "1.2.3"
-
-    environment = Environment(loader=FileSystemLoader(TEST_DATA_PATH))
-    template = environment.get_template("istioctl_version_output_template.yaml.j2")
-    istioctl_version_output_str = template.render(
-        client_version=client_version,
-        control_version="None",
-    )
-
-    istioctl_version_output = yaml.safe_load(istioctl_version_output_str)
-
-    assert get_client_version(istioctl_version_output) == client_version
+    assert get_client_version(CLIENT_ONLY_VERSION_OUTPUT) == "1.2.3"
 
 
 def test_get_client_version_no_version():
@@ -287,18 +291,7 @@ def test_get_client_version_no_version():
 
 
 def test_get_control_plane_version():
-    control_plane_version = "3.2.1"
-
-    environment = Environment(loader=FileSystemLoader(TEST_DATA_PATH))
-    template = environment.get_template("istioctl_version_output_template.yaml.j2")
-    istioctl_version_output_str = template.render(
-        client_version="None",
-        control_version=control_plane_version,
-    )
-
-    istioctl_version_output = yaml.safe_load(istioctl_version_output_str)
-
-    assert get_control_plane_version(istioctl_version_output) == control_plane_version
+    assert get_control_plane_version(CONTROL_PLANE_ONLY_VERSION_OUTPUT) == "3.2.1"
 
 
 def test_get_control_plane_version_no_version():
@@ -308,20 +301,13 @@ def test_get_control_plane_version_no_version():
 
 
 def test_get_control_plane_version_too_many_meshes():
-    istioctl_version_output = yaml.safe_load(
-        (TEST_DATA_PATH / "istioctl_version_output_too_many_meshes.yaml").read_text()
-    )
-
     with pytest.raises(IstioctlError):
-        get_control_plane_version(istioctl_version_output)
+        get_control_plane_version(TOO_MANY_MESHES_VERSION_OUTPUT)
 
 
 def test_get_control_plane_version_no_pilot_in_meshes():
-    istioctl_version_output = yaml.safe_load(
-        (TEST_DATA_PATH / "istioctl_version_output_no_pilot_in_control.yaml").read_text()
-    )
     with pytest.raises(IstioctlError):
-        get_control_plane_version(istioctl_version_output)
+        get_control_plane_version(NO_PILOT_VERSION_OUTPUT)
 
 
 @pytest.mark.parametrize(